@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 
 import shell.exceptions as exceptions
+import shell.stream as stream
+import shell.reactor as reactor
 
 import shell.bin as bin
 from shell.bin import  (run,
+                        run_many,
+                        run_many_sync,
                         bytify
                        )
 
@@ -16,4 +20,12 @@ from shell.api import (ShellCommandExists,
 import shell.classes as classes
 from shell.classes import   (ShellCommand,
                              ShellPipe,
-                            )
\ No newline at end of file
+                             ShellPipeline,
+                             shutdown_streams,
+                            )
+
+import shell.shared as shared
+from shell.shared import SharedShell
+
+import shell.pool as pool
+from shell.pool import ShellCommandPool
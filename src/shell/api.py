@@ -3,17 +3,14 @@ from typing import Any, Dict, Iterable, List, Union
 
 import shell.bin
 
-class ShellCommandExists():
+class ProgramSingletonMeta(type):
     """
-    A psuedo-Singleton class that create only one instance of each unique 'command' value.
-    This avoids spending time running subprocesses more than once.
-    """
-
-    _instances={}   # this dict is shared by all instances, do not create a new one
+    Metaclass that creates only one instance per program name of the command passed.
 
-    exists = None
+    Cache hits are returned directly from __call__, skipping __new__ and __init__ altogether.
+    """
 
-    def __new__(
+    def __call__(
         cls,
         command:Union[
             List[str],
@@ -22,23 +19,25 @@ class ShellCommandExists():
         *args,
         **kwargs,
     ):
-        """
-        Create new instance if cls(command) was not called before;
-            otherwise return the instance that already exists.
-        Put the instance back into the library.
-        """
+        # Availability only depends on the program, not its arguments
+        _program = shell.bin.get_program(command)
 
-        _command_str = " ".join(command) if (isinstance(command, (list, tuple))) else command
+        _instance = cls._instances.get(_program)
 
-        _instance = cls._instances.get(
-            _command_str,
-            super().__new__(cls)
-        )
-
-        cls._instances[_command_str] = _instance
+        if (_instance is None):
+            _instance = super().__call__(command, *args, **kwargs)
+            cls._instances[_program] = _instance
 
         return _instance
-    
+
+class ShellCommandExists(metaclass=ProgramSingletonMeta):
+    """
+    A psuedo-Singleton class that create only one instance of each unique program name.
+    This avoids checking for the same program more than once.
+    """
+
+    _instances={}   # this dict is shared by all instances, do not create a new one
+
     def __init__(
         self,
         command:Union[
@@ -50,13 +49,11 @@ class ShellCommandExists():
     ):
         """
         Check if command exists, then store it in self.exists.
+        Only called once per program name.
         """
 
         self.command = command
-
-        # Avoids running this twice if __new__() returned an existing instance
-        if (self.exists is None):
-            self.exists = shell.bin.check_command_exists(command)
+        self.exists = shell.bin.check_command_exists(command)
 
     def __bool__(
         self,
@@ -66,8 +63,6 @@ class ShellCommandExists():
         """
         return self.exists
 
-    __nonzero__ = __bool__
-
     def __repr__(
         self,
     ):
@@ -1,41 +1,60 @@
 #!/usr/bin/env python3
 
+import asyncio
+import functools
+import os
 from typing import Any, Dict, Iterable, List, Union
+import subprocess
 import warnings
 
 from shell.exceptions import ShellReturnedFailure
-from shell.classes import ShellCommand
+from shell.classes import STDERR_MODES, ShellCommand, coerce_bytes, resolve_executable, split_command
 
-def bytify(func):
+def bytify(func, *funcs):
     """
     Wrapper function to convert any single argument str function into a bytes one.
     Useful for ShellFunctionPipe().
+
+    Multiple functions can be passed, in which case they are applied in order,
+    with the intermediate values kept as str; the data is only decoded and encoded once
+    instead of once per function:
+    bytify(str.strip, str.upper)
     """
 
+    _funcs = (func, ) + funcs
+
+    @functools.wraps(func)
     def wrapper(
         data:bytes,
         *args,
         **kwargs,
     ):
-        if (isinstance(data, bytes)):
+        if (isinstance(data, (bytes, bytearray))):
             data_str = data.decode("utf-8")
-        
-        _return = func(data_str)
-        
-        if (isinstance(_return, str)):
-            return _return.encode("utf-8")
         else:
-            return _return
+            data_str = data
+
+        _return = data_str
+        for _func in _funcs:
+            _return = _func(_return)
+
+        if (isinstance(_return, str)):
+            _return = _return.encode("utf-8")
+
+        return _return
 
     return wrapper
 
 def run(
     command:list,
     stdin:Union[str, bytes] = None,
-    output:type = str,
+    output:type = bytes,
     safe_mode:bool=True, # Protect against shell injection
     ignore_codes:list=[],
     timeout:float=None,
+    _capture:bool=True,
+    cache:Union[bool, float]=False,
+    stderr_mode:str="capture",
 ):
     """
     Old functional implementation of shell command execution.
@@ -45,6 +64,18 @@ def run(
 
     Originally safe_mode is implemented to allow plain shell mode - which permits the use of ; | > etc operators chaining multiple commands together.
     This has since been made obsolete to avoid shell injection.
+    Commands are never run through a shell.
+
+    Since v0.2.0, stdout is returned as bytes by default, consistent with ShellCommand;
+    pass output=str to have it decoded.
+
+    _capture=False discards stdout and stderr, for callers that only need to know whether the command succeeded.
+
+    cache=True reuses the result of an earlier identical call instead of running the command again;
+    a number instead of True sets how many seconds old a cached result may be. See ShellCommand.
+
+    stderr_mode="devnull" discards stderr in the kernel, for callers that never look at it,
+    e.g. commands printing progress bars; "merge" merges it into stdout. See ShellCommand.
     """
 
     if (not safe_mode):
@@ -52,15 +83,17 @@ def run(
             DeprecationWarning("Shell mode in shell.run() is no longer supported. safe_mode is required as True.")
         )
 
-    with ShellCommand(
+    return ShellCommand(
         command=command,
         output=output,
         ignore_codes=ignore_codes,
         timeout=timeout,
-    ) as _command:
-        return _command.end(
-            stdin
-        )
+        capture=_capture,
+        cache=cache,
+        stderr_mode=stderr_mode,
+    ).run(
+        stdin
+    )
 
     """
     Follwoing is the original code for <0.1.0
@@ -119,25 +152,165 @@ def run(
     #     return _stdout
 
 
-def check_command_exists(
+async def _run_async(
+    command:ShellCommand,
+    stdin:bytes = None,
+)->Union[bytes, str, ShellReturnedFailure]:
+    """
+    Run a ShellCommand instance as an asyncio subprocess, and return its result.
+    """
+
+    command.start_timer()
+
+    _executable = resolve_executable(command.command[0])
+
+    if (_executable is None):
+        return command.not_found()
+
+    try:
+        _process = await asyncio.create_subprocess_exec(
+            *command.command,
+            executable=_executable,
+            stdin=subprocess.PIPE if stdin is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=STDERR_MODES[command.stderr_mode],
+        )
+    except FileNotFoundError as e:
+        return command.not_found()
+
+    command.run_count += 1
+
+    # Shielded, so that a timeout does not cancel it and lose the output read so far;
+    # once the process is killed, it finishes reading what is left.
+    _communicate = asyncio.ensure_future(_process.communicate(stdin))
+
+    try:
+        _stdout, _stderr = await asyncio.wait_for(
+            asyncio.shield(_communicate),
+            timeout=command.timeout,
+        )
+    except asyncio.TimeoutError as e:
+        _process.kill()
+        _stdout, _stderr = await _communicate
+
+    return command.set_result(
+        exit_code=_process.returncode,
+        stdout=_stdout,
+        stderr=_stderr,
+    )
+
+async def run_many(
+    commands:Iterable[Union[list, str]],
+    stdin:Union[str, bytes] = None,
+    output:type = bytes,
+    ignore_codes:list=[],
+    timeout:float=None,
+    stderr_mode:str="capture",
+)->List[Union[bytes, str, ShellReturnedFailure]]:
+    """
+    Run multiple shell commands concurrently, and return their results in the same order.
+
+    All commands are spawned at once and awaited together,
+    so the total wall time is that of the slowest command rather than the sum of all of them.
+    The arguments, other than commands, are applied to every command; see run() for details.
+    """
+
+    stdin = coerce_bytes(stdin)
+
+    # Normalise once, instead of in every ShellCommand
+    if (not isinstance(ignore_codes, range)):
+        ignore_codes = frozenset(ignore_codes)
+
+    _commands = [
+        ShellCommand(
+            command=_command,
+            output=output,
+            ignore_codes=ignore_codes,
+            timeout=timeout,
+            stderr_mode=stderr_mode,
+        )
+        for _command in commands
+    ]
+
+    return list(
+        await asyncio.gather(
+            *(_run_async(_command, stdin) for _command in _commands)
+        )
+    )
+
+def run_many_sync(
+    commands:Iterable[Union[list, str]],
+    stdin:Union[str, bytes] = None,
+    output:type = bytes,
+    ignore_codes:list=[],
+    timeout:float=None,
+    stderr_mode:str="capture",
+)->List[Union[bytes, str, ShellReturnedFailure]]:
+    """
+    Blocking version of run_many(), for use outside of an event loop.
+    """
+
+    return asyncio.run(
+        run_many(
+            commands=commands,
+            stdin=stdin,
+            output=output,
+            ignore_codes=ignore_codes,
+            timeout=timeout,
+            stderr_mode=stderr_mode,
+        )
+    )
+
+def get_program(
     command: Union[
         List[str],
         str
     ],
-):
+)->str:
     """
-    Check if a command returns a specific error code of 127,
-    which is command not found.
+    Return the program name of a command, i.e. its first token.
+    Return an empty str if the command is empty.
     """
 
-    _return = run(
-        command,
-        safe_mode = True,
-    )
+    if (isinstance(command, (list, tuple))):
+        return command[0] if command else ""
+    else:
+        _split = split_command(command)
+        return _split[0] if _split else ""
+
+def check_program_exists(
+    program:str,
+)->bool:
+    """
+    Check if a program can be found, without running it.
+
+    Program names are looked up on PATH with resolve_executable(), which ShellCommand uses to launch them,
+    so a program found here is already resolved when it is run later;
+    absolute or relative paths are checked for execute permission instead.
+
+    Only programs found are cached, by resolve_executable() against the current PATH;
+    a program that is missing is looked up again next time, in case it has been installed since.
+    """
+
+    if (not program):
+        return False
+
+    if (os.path.dirname(program)):
+        return os.path.isfile(program) and os.access(program, os.X_OK)
 
-    if (isinstance(_return, ShellReturnedFailure)):
-        if (_return.exit_code == 127):
-            return False
+    return resolve_executable(program) is not None
 
-    return True
+def check_command_exists(
+    command: Union[
+        List[str],
+        str
+    ],
+)->bool:
+    """
+    Check if a command can be found, without running it.
+
+    Only the program name - the first token of command - is looked up, so arguments do not matter.
+    This spares a fork/exec for what is just a PATH lookup, and avoids running commands with side effects.
+    """
 
+    return check_program_exists(get_program(command))
@@ -1,22 +1,271 @@
 #!/usr/bin/env python3
 import abc
+import atexit
+import collections
+import concurrent.futures
+import fcntl
+import functools
 import io
+import os
+import selectors
 import shlex
+import shutil
+import signal
 import subprocess
-import threading
 import time as timer
 import warnings
 
-from typing import Any, Callable, Dict, Iterable, List, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
 
 from shell.exceptions import    InvalidParameterError, \
                                 ShellPipeImpossible, \
                                 ShellReturnedFailure, \
                                 ShellProcessInactive, \
                                 ShellProcessAlreadyRunning
+from shell.reactor import StreamReactor
+from shell.stream import push_data, read_full_into, read_into
 
 DEFAULT_STDOUT_CHUNK_SIZE = 2**20
+STDERR_MODES = {
+    "capture":  subprocess.PIPE,
+    "devnull":  subprocess.DEVNULL,
+    "merge":    subprocess.STDOUT,
+}
+PIPE_READ_SIZE = 2**16  # Default pipe capacity on Linux; a single read() from such a pipe never returns more than this
+
+@functools.lru_cache(maxsize=1024)
+def split_command(
+    command:str,
+)->tuple:
+    """
+    shlex.split() a command str, with results cached.
+
+    shlex is a pure Python lexer; commands executed repeatedly only need to be split once.
+    A tuple is returned so that the cached value cannot be mutated.
+    """
+    return tuple(shlex.split(command))
+
+def coerce_bytes(
+    data:Union[bytes, str, None],
+)->Union[bytes, None]:
+    """
+    Encode data into bytes if it is a str; return anything else, including bytes and None, as is.
+    """
+    if (isinstance(data, str)):
+        return data.encode("utf-8")
+
+    return data
+
+RUN_CACHE_MAX_SIZE = 256
+_RUN_CACHE = collections.OrderedDict()  # key -> (perf_counter() when cached, exit_code, stdout, stderr, time_used), least recently used first
+
+# Streaming threads spend their time blocked on I/O rather than on CPU, so the pool is generous;
+# too few workers would leave streams queueing behind each other with their processes stalled on full pipes.
+STREAM_POOL_MAX_WORKERS = max(32, (os.cpu_count() or 1) * 2)
+_STREAM_POOL = None
+
+def stream_pool()->concurrent.futures.ThreadPoolExecutor:
+    """
+    Return the thread pool used by ShellCommand.stream_stdout(), creating it if necessary.
+    """
+    global _STREAM_POOL
+
+    if (_STREAM_POOL is None):
+        _STREAM_POOL = concurrent.futures.ThreadPoolExecutor(
+            max_workers=STREAM_POOL_MAX_WORKERS,
+            thread_name_prefix="shell-stream",
+        )
+
+    return _STREAM_POOL
+
+_STREAM_REACTOR = None
+
+def stream_reactor()->StreamReactor:
+    """
+    Return the StreamReactor used by ShellCommand.stream_stdout() if reactor_streams is set, creating it if necessary.
+
+    Its thread is a daemon, so it is shut down at exit, letting streams in flight finish as the pool does.
+    """
+    global _STREAM_REACTOR
+
+    if (_STREAM_REACTOR is None):
+        _STREAM_REACTOR = StreamReactor()
+        atexit.register(_STREAM_REACTOR.shutdown)
+
+    return _STREAM_REACTOR
+
+def shutdown_streams(
+    wait:bool=True,
+)->None:
+    """
+    Shut down the thread pool and the reactor used by ShellCommand.stream_stdout().
+    If wait is True, block until all ongoing streams are finished.
+
+    New ones will be created if stream_stdout() is called again afterwards.
+    """
+    global _STREAM_POOL, _STREAM_REACTOR
+
+    if (_STREAM_POOL is not None):
+        _pool, _STREAM_POOL = _STREAM_POOL, None
+        _pool.shutdown(wait=wait)
+
+    if (_STREAM_REACTOR is not None):
+        _reactor, _STREAM_REACTOR = _STREAM_REACTOR, None
+        atexit.unregister(_reactor.shutdown)
+        _reactor.shutdown(wait=wait)
+
+def drain_pipes(
+    *pipes:io.IOBase,
+    stdin_pipe:io.IOBase=None,
+    stdin:bytes=None,
+    timeout:float=None,
+    on_timeout:Callable=None,
+    read_size:int=PIPE_READ_SIZE,
+)->Tuple[bytes, ...]:
+    """
+    Read all of pipes until each of them is closed by the other end, then close them.
+    Return the bytes read from each pipe, in the same order; None in pipes will give empty bytes.
+
+    If stdin_pipe is given, stdin is written into it alongside the reading, and stdin_pipe is closed afterwards.
+
+    If the pipes are not all closed within timeout seconds, on_timeout() is called once, e.g. to kill the process;
+    reading then carries on until the pipes are closed, so output written before the timeout is kept.
+
+    All pipes are polled with a selector in the current thread, so that none of them can fill up and block its process;
+    this spares the helper threads and the copies of stdin that Popen.communicate() would make.
+
+    Output is accumulated into one growing bytearray per pipe, instead of a list of chunks to be joined,
+    so that the chunks and the joined result are never held at the same time.
+    Each read goes into one scratch buffer shared by all pipes, so no bytes object is allocated per read;
+    read_size should be the capacity of the largest pipe, as no read can return more than that.
+    """
+
+    _buffers = {}
+    _scratch = bytearray(read_size)
+    _scratch_view = memoryview(_scratch)
+    _deadline = None if timeout is None else timer.monotonic() + timeout
+
+    with selectors.DefaultSelector() as _selector:
+        for _pipe in pipes:
+            if (_pipe is not None):
+                _selector.register(_pipe, selectors.EVENT_READ)
+                _buffers[_pipe] = bytearray()
+
+        if (stdin_pipe is not None and not stdin_pipe.closed):
+            try:
+                # Anything written with stream_stdin() before must go first
+                stdin_pipe.flush()
+            except BrokenPipeError as e:
+                stdin = None
+
+            if (stdin):
+                os.set_blocking(stdin_pipe.fileno(), False)
+                _selector.register(stdin_pipe, selectors.EVENT_WRITE)
+                _input = memoryview(stdin)
+                _offset = 0
+            else:
+                _close_quietly(stdin_pipe)
+
+        while (_selector.get_map()):
+            if (_deadline is None):
+                _ready = _selector.select()
+            else:
+                _ready = _selector.select(max(0.0, _deadline - timer.monotonic()))
+
+                # Checked even if pipes are ready, or a chatty process would never time out
+                if (timer.monotonic() >= _deadline):
+                    _deadline = None
+                    if (callable(on_timeout)):
+                        on_timeout()
+
+            for _key, _events in _ready:
+                if (_key.fileobj is stdin_pipe):
+                    try:
+                        _offset += os.write(_key.fd, _input[_offset:_offset+PIPE_READ_SIZE])
+                    except BlockingIOError as e:
+                        continue
+                    except BrokenPipeError as e:
+                        # The process does not want any more stdin
+                        _offset = len(_input)
+
+                    if (_offset >= len(_input)):
+                        _selector.unregister(stdin_pipe)
+                        _close_quietly(stdin_pipe)
+
+                    continue
+
+                _size = os.readv(_key.fd, (_scratch, ))
+
+                if (_size):
+                    _buffers[_key.fileobj] += _scratch_view[:_size]
+                else:
+                    _selector.unregister(_key.fileobj)
+                    _key.fileobj.close()
+
+    return tuple(
+        bytes(_buffers[_pipe]) if _pipe in _buffers else b""
+        for _pipe in pipes
+    )
+
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", None)    # Linux only
+
+def resize_pipe(
+    pipe:io.IOBase,
+    size:int,
+)->int:
+    """
+    Ask the kernel for a pipe buffer of size bytes, so that a bursty process blocks on a full pipe less often.
+    Return the resulting size, or 0 if it cannot be changed on this platform.
+
+    Unprivileged processes are capped at /proc/sys/fs/pipe-max-size (1 MiB by default);
+    the request is silently left as is if it is refused.
+    """
+
+    if (F_SETPIPE_SZ is None or pipe is None):
+        return 0
+
+    try:
+        return fcntl.fcntl(pipe.fileno(), F_SETPIPE_SZ, size)
+    except OSError as e:
+        return 0
+
+def _close_quietly(
+    pipe:io.IOBase,
+)->None:
+    """
+    Close a pipe to a process, ignoring if the process had already closed its end.
+    """
+    try:
+        pipe.close()
+    except BrokenPipeError as e:
+        pass
+
+_EXECUTABLES = {}   # (program, PATH) -> absolute path of executable
+
+def resolve_executable(
+    program:str,
+)->Union[str, None]:
+    """
+    Resolve a program name into the path of its executable by searching PATH, with results cached.
+    Return None if the program cannot be found.
+
+    Programs containing a directory are returned as is, without checks.
+    Only successful lookups are cached, so that programs installed later can still be found.
+    """
+
+    if (os.path.dirname(program)):
+        return program
 
+    _key = (program, os.environ.get("PATH", os.defpath))
+    _executable = _EXECUTABLES.get(_key)
+
+    if (_executable is None):
+        _executable = shutil.which(program)
+
+        if (_executable is not None):
+            _EXECUTABLES[_key] = _executable
+
+    return _executable
 
 
 
@@ -24,6 +273,8 @@ class ShellPipe(abc.ABC):
     """
     Abstract Base Class for one member of a Pythonic shell pipe.
     """
+    __slots__ = ()  # Allows subclasses to do without a __dict__
+
     obj = None      # this is the object which the Pipe is wrapping around; could be bytes, str, method or I/O-like object.
 
     def __new__(
@@ -37,24 +288,25 @@ class ShellPipe(abc.ABC):
 
         Simply:
         ShellPipe(["", ])       will return a ShellCommand instance
+        ShellPipe(("", ))       will return a ShellCommand instance
         ShellPipe(bytes())      will return a ShellBytesPipe instance
         ShellPipe(str())        will return a ShellStrPipe instance
         ShellPipe(lambda :  )   will return a ShellFunctionPipe instance
         ShellPipe(IOBase())     will return a ShellIOPipe instance
         """
 
-        _type_map = {
-            list:       ShellCommand,
-            bytes:      ShellBytesPipe,
-            str:        ShellStrPipe,
-            io.IOBase:  ShellIOPipe,
-        }
-
+        # Exact type match
+        _subclass = _TYPE_MAP.get(type(obj))
+        if (_subclass is not None):
+            return super().__new__(_subclass)
 
-        # Check type mapping table to see if there is a match
-        for _type in _type_map:
+        # Check type mapping table to see if there is a match for subclasses
+        for _type, _subclass in _TYPE_MAP.items():
             if (isinstance(obj, _type)):
-                return super().__new__(_type_map[_type])
+                return super().__new__(_subclass)
+
+        if (isinstance(obj, io.IOBase)):
+            return super().__new__(ShellIOPipe)
 
         # No match, look for other clues
 
@@ -107,28 +359,30 @@ class ShellPipe(abc.ABC):
         Pipe the stdout from self into other.
         """
 
-        # Try converting source into a ShellPipe
+        # Try converting source and dest into ShellPipes
         # If it doesn't work then InvalidParameterError will be thrown.
-        if (not isinstance(source, ShellPipe)):
+        # Exact class lookups first, as both are nearly always one of our own classes already.
+        if (type(source) not in _PIPE_CLASSES and not isinstance(source, ShellPipe)):
             source = ShellPipe(source)
-        
-        # Try converting dest into a ShellPipe
-        # If it doesn't work then InvalidParameterError will be thrown.
-        if (not isinstance(dest, ShellPipe)):
+
+        if (type(dest) not in _PIPE_CLASSES and not isinstance(dest, ShellPipe)):
             dest = ShellPipe(dest)
 
-        
+        # Commands that are yet to run are connected directly into a pipeline, which runs once its result is needed
+        if (isinstance(dest, ShellCommand) and dest.can_pipe_from(source)):
+            return ShellPipeline(source, dest)
+
         _stdin = source.pipe_out()
-        
+
         if (isinstance(_stdin, Exception)):
             raise _stdin
-        else:
-            _stdout = dest.pipe_in(_stdin)
 
-            if (isinstance(_stdout, Exception)):
-                raise _stdout
-            else:
-                return _stdout
+        _stdout = dest.pipe_in(_stdin)
+
+        if (isinstance(_stdout, Exception)):
+            raise _stdout
+
+        return _stdout
 
     def __gt__(self, dest):
         """
@@ -190,6 +444,8 @@ class ShellBytesPipe(ShellPipe):
 
     Normally used at the start or end of a ShellPipe; it is not meaningful to use it in between.
     """
+    __slots__ = ("_data", )
+
     def __init__(
         self,
         obj:bytes,
@@ -247,11 +503,17 @@ class ShellStrPipe(ShellBytesPipe):
 
     Normally used at the start or end of a ShellPipe; it is not meaningful to use it in between.
     """
+    __slots__ = ("_encoded", )
+
     @property
     def obj(
         self,
     )->bytes:
-        return self._data.encode("utf-8")
+        # Encode once, then reuse for every subsequent fetch
+        if (self._encoded is None):
+            self._encoded = self._data.encode("utf-8")
+
+        return self._encoded
 
     @obj.setter
     def obj(
@@ -261,8 +523,11 @@ class ShellStrPipe(ShellBytesPipe):
         # Just store the str, we'll do the encoding when value get fetched
         if (isinstance(value, str)):
             self._data = value
+            self._encoded = None
         elif (isinstance(value, bytes)):
-            self._data = value.decode("utf-8")
+            # Already encoded; no need to round trip through str
+            self._data = None
+            self._encoded = value
         else:
             raise InvalidParameterError(
                 f"{type(self).__name__} expects str for value."
@@ -276,6 +541,8 @@ class ShellIOPipe(ShellPipe):
     This allows part of the ShellPipe to include Pythonic IO objects, such as:
     ShellCommand("ls -la") | ShellIOPipe(some_manipulating_io) | ShellCommand("grep something")
     """
+    __slots__ = ("obj", )
+
     def __init__(
         self,
         obj:Union[
@@ -359,6 +626,8 @@ class ShellFunctionPipe(ShellPipe):
     This allows part of the ShellPipe to include Python methods, such as:
     ShellCommand("ls -la") | ShellFunctionPipe(upper) | ShellCommand("grep something")
     """
+    __slots__ = ("obj", "output")
+
     def __init__(
         self,
         obj:Callable,
@@ -405,7 +674,30 @@ class ShellCommand(ShellPipe):
     ; and >> will not be supported.
     """
 
-    process = None
+    __slots__ = (
+        "_command",
+        "_ignore_codes",
+        "output",
+        "timeout",
+        "capture",
+        "bufsize",
+        "stderr_mode",
+        "cache",
+        "process",
+        "last_poll",        # perf_counter() of the last process.poll() in alive
+        "run_count",
+        "timer_start",
+        "exit_code",
+        "_stdout",
+        "_stderr",
+        "time_used",
+    )
+
+    poll_interval = 0.0001  # seconds; enough to collapse the repeated checks within one call
+    fast_communicate = True # Use drain() instead of Popen.communicate()
+    shared_shell = None     # A shell.shared.SharedShell to dispatch run() to, instead of starting a process each time
+    pipe_size = None        # Kernel buffer size to request for the stdout pipe on Linux; None to keep the default
+    reactor_streams = False # Serve stream_stdout() from one shared selector thread, instead of a pool thread each
 
     def __new__(
         cls,
@@ -413,6 +705,10 @@ class ShellCommand(ShellPipe):
         output:type = bytes,
         ignore_codes:list=[],
         timeout:float=None,
+        capture:bool=True,
+        bufsize:int=-1,
+        stderr_mode:str="capture",
+        cache:Union[bool, float]=False,
     )->"ShellCommand":
         # Override the ShellPipe method.
         return object.__new__(cls)
@@ -423,7 +719,29 @@ class ShellCommand(ShellPipe):
         output:type = bytes,
         ignore_codes:list=[],
         timeout:float=None,
+        capture:bool=True,
+        bufsize:int=-1,
+        stderr_mode:str="capture",
+        cache:Union[bool, float]=False,
     )->None:
+        """
+        If capture is False, stdout and stderr of the process are discarded to /dev/null;
+        useful when only the exit code matters.
+
+        bufsize is the buffer size of the pipe file objects, as in subprocess.Popen; -1 for io.DEFAULT_BUFFER_SIZE.
+        stdout is read straight from the pipe, so this mostly concerns stream_stdin():
+        data written is held in the buffer until it is full or flushed.
+
+        stderr_mode is one of:
+        - "capture" - stderr is collected into self.stderr,
+        - "devnull" - stderr is discarded, sparing a pipe that would need draining,
+        - "merge"   - stderr is merged into stdout, like 2>&1 in shell.
+        In the latter two cases self.stderr will be empty.
+
+        If cache is True, successful results of run() are shared with all other ShellCommands
+        with the same command, stdin and settings, and the process is only ever run once;
+        if cache is a number, only results cached within that many seconds are reused.
+        """
         
         # Checking variables and putting them as attributes
         self.command = command
@@ -431,16 +749,24 @@ class ShellCommand(ShellPipe):
         if (output not in (bytes,str,)): raise InvalidParameterError(f"Either bytes or str expected for output, {type(output).__name__} found.")
         self.output = output
 
-        if (not isinstance(ignore_codes, (list, range, tuple))):
-            try:
-                ignore_codes = list(ignore_codes)
-            except TypeError as e:
-                raise InvalidParameterError(f"list type expected for ignore_codes, {type(ignore_codes).__name__} found.")
         self.ignore_codes = ignore_codes
 
         if (not isinstance(timeout, (int, float, type(None)))): raise InvalidParameterError(f"Numeric types expected for timeout, {type(timeout).__name__} found.")
         self.timeout = timeout
 
+        self.capture = bool(capture)
+
+        if (not isinstance(bufsize, int)): raise InvalidParameterError(f"int expected for bufsize, {type(bufsize).__name__} found.")
+        self.bufsize = bufsize
+
+        if (stderr_mode not in STDERR_MODES): raise InvalidParameterError(f"One of {', '.join(map(repr, STDERR_MODES))} expected for stderr_mode, {repr(stderr_mode)} found.")
+        self.stderr_mode = stderr_mode
+
+        if (not isinstance(cache, (bool, int, float))): raise InvalidParameterError(f"bool or numeric types expected for cache, {type(cache).__name__} found.")
+        self.cache = cache
+
+        self.process = None
+        self.last_poll = 0.0
         self.run_count = 0
         self.timer_start = None
         self.exit_code = None
@@ -451,7 +777,7 @@ class ShellCommand(ShellPipe):
     def __repr__(
         self,
     )->str:
-        return f"{type(self).__name__}(command={repr(self.command)}, output={self.output.__name__}, ignore_codes={repr(self.ignore_codes)}, timeout={repr(self.timeout)})"
+        return f"{type(self).__name__}(command={repr(self.command)}, output={self.output.__name__}, ignore_codes={repr(self.ignore_codes)}, timeout={repr(self.timeout)}, capture={repr(self.capture)}, bufsize={repr(self.bufsize)}, stderr_mode={repr(self.stderr_mode)}, cache={repr(self.cache)})"
 
     def __enter__(
         self,
@@ -498,13 +824,43 @@ class ShellCommand(ShellPipe):
         """
 
         if (isinstance(value, str)):
-            value = shlex.split(value)
+            value = list(split_command(value))
+        elif (isinstance(value, tuple)):
+            value = list(value)
 
         if (not isinstance(value, list)):
-            raise InvalidParameterError(f"str or list types expected for command, {type(value).__name__} found.")
+            raise InvalidParameterError(f"str, list or tuple types expected for command, {type(value).__name__} found.")
         else:
             self._command = value
 
+    @property
+    def ignore_codes(
+        self,
+    )->Union[frozenset, range]:
+        """
+        Exit codes to be treated as success, stored as a frozenset or a range
+        """
+        return self._ignore_codes
+
+    @ignore_codes.setter
+    def ignore_codes(
+        self,
+        value:Iterable[int],
+    ):
+        """
+        ignore_codes.setter
+        Normalise into a frozenset for hashed lookups in result;
+        range already has O(1) membership tests, so leave it alone.
+        """
+
+        if (not isinstance(value, (range, frozenset))):
+            try:
+                value = frozenset(value)
+            except TypeError as e:
+                raise InvalidParameterError(f"list type expected for ignore_codes, {type(value).__name__} found.")
+
+        self._ignore_codes = value
+
     @property
     def can_run(
         self,
@@ -529,86 +885,239 @@ class ShellCommand(ShellPipe):
     )->bool:
         """
         Check if the subprocess is initiated and alive
+
+        poll() costs a waitpid() system call; while the process is alive, it is called at most once every poll_interval seconds.
+        A process that exited within that interval may still be reported as alive.
         """
 
-        if (isinstance(self.process, subprocess.Popen)):
-            if (self.process.poll() is None):
-                return True
-        
-        return False
+        if (self.process is None or self.process.returncode is not None):
+            return False
 
-    # Decorator
-    def alive_only(
-        func,
-    ):
-        def wrapper(
-            self,
-            *args,
-            **kwargs,
-        ):
-            if (self.alive):
-                return func(self, *args, **kwargs)
-            else:
-                return ShellProcessInactive(f"Subprocess for {' '.join(self.command)} is inactive.")
-        
-        return wrapper
+        _now = timer.perf_counter()
+        if (_now - self.last_poll < self.poll_interval):
+            return True
+
+        self.last_poll = _now
+        return self.process.poll() is None
 
     def start(
         self,
+        pipe_stdin:Union[bool, io.IOBase]=True,
     )->Union[subprocess.Popen, Exception]:
         """
         Start process
+
+        If pipe_stdin is False, stdin of the process will be /dev/null instead of a pipe;
+        this saves creating a pipe that will never be written to.
+        If pipe_stdin is a file object, such as stdout of another process, it will be used as stdin directly.
         """
 
+        if (pipe_stdin is True):
+            _stdin = subprocess.PIPE
+        elif (pipe_stdin is False):
+            _stdin = subprocess.DEVNULL
+        else:
+            _stdin = pipe_stdin
+
         if (not self.alive):
+            self.start_timer()
+
+            # Resolving the executable ourselves spares the PATH search on every launch,
+            # and finds missing commands without spawning anything.
+            _executable = resolve_executable(self.command[0])
+
+            if (_executable is None):
+                return self.not_found()
+
             try:
-                self.start_timer()
                 self.process = subprocess.Popen(
                     self.command,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    shell=isinstance(self.command, str),    # always False in its current implementation
+                    executable=_executable,
+                    bufsize=self.bufsize,
+                    stdin=_stdin,
+                    stdout=subprocess.PIPE if self.capture else subprocess.DEVNULL,
+                    stderr=STDERR_MODES[self.stderr_mode] if self.capture else subprocess.DEVNULL,
+                    shell=False,    # self.command is always a list; never go through /bin/sh
+                    # Keep inheritable fds of this process, e.g. from os.set_inheritable(), out of the child.
+                    # CPython 3.10+ still launches it with vfork() on Linux; older versions fork().
+                    close_fds=True,
                 )
 
+                # Opt-in: enlarged pipes count against the per-user pipe-user-pages-soft limit,
+                # beyond which every new pipe of the user is cut down to 2 pages
+                if (self.pipe_size):
+                    resize_pipe(self.process.stdout, self.pipe_size)
+
                 self.run_count += 1
+                self.exit_code = None   # Results from any previous run are now stale
                 return self.process
             # when an unknown command is called, subprocess actually triggers
             # a FileNotFoundError instead of error code 127 like shell would
             except FileNotFoundError as e:
-                self.set_result(
-                    exit_code=127,
-                    stdout=b"",
-                    stderr=f"Shell command '{self.command[0]}' not found.".encode("utf-8"),
-                )
-                return self.result
+                # The cached executable may have been removed since
+                _EXECUTABLES.pop((self.command[0], os.environ.get("PATH", os.defpath)), None)
+                return self.not_found()
         else:
-            return ShellProcessAlreadyRunning(f"Subprocess for {' '.join(self.command)} is already running at PID {self.process.pid}.")
+            return ShellProcessAlreadyRunning(command=self.command, pid=self.process.pid)
+
+    def not_found(
+        self,
+    )->ShellReturnedFailure:
+        """
+        Set the result to exit code 127, as shell would for a command that is not found.
+        """
+
+        return self.set_result(
+            exit_code=127,
+            stdout=b"",
+            stderr=f"Shell command '{self.command[0]}' not found.".encode("utf-8"),
+        )
 
     def end(
         self,
         stdin:bytes=None,
     )->Union[bytes, str, ShellReturnedFailure]:
         """
-        Pipe stdin in, and wait for the 
+        Pipe stdin in, and wait for the process to exit; then return the result.
         """
 
-        if (isinstance(stdin, str)):
-            stdin = stdin.encode("utf-8")
+        stdin = coerce_bytes(stdin)
+
+        # Never started, or results had already been collected
+        if (not self.can_run or self.exit_code is not None):
+            return self.result
+
+        _stdout, _stderr, _timed_out = self.collect(stdin)
+
+        if (_timed_out):
+            return self.kill()
+
+        return self.set_result(
+            exit_code = self.process.returncode,
+            stdout = _stdout,
+            stderr = _stderr,
+        )
+
+    def collect(
+        self,
+        stdin:bytes=None,
+    )->Tuple[bytes, bytes, bool]:
+        """
+        Feed stdin into the process, and collect stdout and stderr until it exits.
+
+        Return a tuple of (stdout, stderr, timed_out).
+        If timed_out is True, the process had not exited within timeout and is still running.
+        """
+
+        if (self.process.stdin is None):
+            stdin = None
+
+        if (not self.capture):
+            # No output to read; only wait for the exit code
+            self.close_stdin(stdin)
 
-        if (self.can_run):
             try:
-                _stdout, _stderr = self.process.communicate(input=stdin, timeout=self.timeout)
+                self.process.wait(timeout=self.timeout)
             except subprocess.TimeoutExpired as e:
-                return self.kill()
+                return b"", b"", True
+
+            return b"", b"", False
+
+        if (self.fast_communicate):
+            # Feed and read the pipes in this thread; a process that times out is killed within,
+            # and the result is collected as with any other exit.
+            return (*self.drain(stdin, timeout=self.timeout), False)
 
-            return self.set_result(
-                exit_code = self.process.returncode,
-                stdout = _stdout,
-                stderr = _stderr,
+        try:
+            return (*self.process.communicate(input=stdin, timeout=self.timeout), False)
+        except subprocess.TimeoutExpired as e:
+            return None, None, True
+
+    def close_stdin(
+        self,
+        stdin:bytes=None,
+    )->None:
+        """
+        Write stdin, if any, into the process in one go, then close its stdin pipe.
+        A process exiting without reading all of stdin is not an error.
+        """
+
+        if (self.process.stdin is None or self.process.stdin.closed):
+            return None
+
+        try:
+            if (stdin):
+                self.process.stdin.write(stdin)
+            self.process.stdin.close()
+        except BrokenPipeError as e:
+            pass
+
+    def drain(
+        self,
+        stdin:bytes=None,
+        timeout:float=None,
+    )->Tuple[bytes, bytes]:
+        """
+        Feed stdin into the process, and read stdout and stderr until both are closed by the process;
+        then wait for it to exit.
+
+        All pipes are polled with a selector in the current thread, so that none of them can fill up and block the process.
+        If timeout is given, the process is killed once it is reached; the selector waits out the time,
+        so no timer or helper threads are needed.
+        """
+
+        _outputs = drain_pipes(
+            self.process.stdout,
+            self.process.stderr,
+            stdin_pipe=self.process.stdin,
+            stdin=stdin,
+            timeout=timeout,
+            on_timeout=self.process.kill,
+            read_size=max(PIPE_READ_SIZE, self.pipe_size or 0),
+        )
+
+        self.process.wait()
+
+        return _outputs
+
+    def can_pipe_from(
+        self,
+        source:Union["ShellCommand", "ShellPipeline"],
+    )->bool:
+        """
+        Check if stdout of source can be connected directly into stdin of self, in a ShellPipeline.
+        """
+        if (isinstance(source, ShellPipeline)):
+            # Every command in source was checked when it was added
+            return (
+                not (source.has_run or self.has_run) and
+                self.capture and
+                self.timeout is None
             )
-        else:
-            return self.result
+
+        return (
+            isinstance(source, ShellCommand) and
+            not (source.has_run or self.has_run) and
+            source.capture and self.capture and
+            source.timeout is None and self.timeout is None
+        )
+
+    def pipe_from(
+        self,
+        source:"ShellCommand",
+    )->"ShellCommand":
+        """
+        Run source and self concurrently, with stdout of source connected directly into stdin of self,
+        like a pipe in shell.
+
+        stdout of source never passes through Python, so source.stdout will be empty.
+        Return self to be chained; raise the failure of source if it did not succeed,
+        unless it was killed by SIGPIPE because self exited early.
+        """
+
+        ShellPipeline(source, self).run()
+
+        return self
 
     def run(
         self,
@@ -618,16 +1127,115 @@ class ShellCommand(ShellPipe):
         Run the command once in blocking mode, then return the result.
         """
 
-        if (isinstance(stdin, str)):
-            stdin = stdin.encode("utf-8")
+        stdin = coerce_bytes(stdin)
+
+        _cache_key = None
+        if (self.cache is not False and not self.has_run):
+            _cache_key = (tuple(self.command), stdin, self.output, self.capture, self.stderr_mode)
+
+            if (self.load_cache(_cache_key)):
+                return self.result
+
+        # The shared shell cannot feed stdin or enforce a timeout
+        if (self.shared_shell is not None and stdin is None and self.timeout is None and not self.has_run):
+            self.run_shared()
 
         if (not self.has_run):
-            self.start()
+            self.start(pipe_stdin=stdin is not None)
 
-        if (self.alive):
+        # Not self.alive: a quick process may have exited already, but its output still needs collecting
+        if (self.can_run):
             self.end(stdin)
 
-        return self.result
+        _result = self.result
+
+        if (_cache_key is not None and not isinstance(_result, Exception)):
+            self.save_cache(_cache_key)
+
+        return _result
+
+    def run_shared(
+        self,
+    )->Union[bytes, str, ShellReturnedFailure, None]:
+        """
+        Run the command in shared_shell, then return the result.
+
+        Return None if the shared shell died during the command,
+        in which case the command is left not run.
+        """
+
+        self.start_timer()
+
+        if (resolve_executable(self.command[0]) is None):
+            return self.not_found()
+
+        _returned = self.shared_shell.run(
+            self.command,
+            capture=self.capture,
+            stderr_mode=self.stderr_mode,
+        )
+
+        if (_returned is None):
+            self.end_timer()
+            return None
+
+        self.run_count += 1
+        _exit_code, _stdout, _stderr = _returned
+
+        return self.set_result(
+            exit_code=_exit_code,
+            stdout=_stdout,
+            stderr=_stderr,
+        )
+
+    def load_cache(
+        self,
+        key:tuple,
+    )->bool:
+        """
+        Populate the results from _RUN_CACHE, if key is found and not older than self.cache seconds.
+        Return whether the results were loaded.
+        """
+
+        _cached = _RUN_CACHE.get(key)
+
+        if (_cached is None):
+            return False
+
+        # cache=True accepts results of any age; note that True is also an int
+        if (self.cache is not True and timer.perf_counter() - _cached[0] > self.cache):
+            return False
+
+        _, self.exit_code, self.stdout, self.stderr, self.time_used = _cached
+
+        _RUN_CACHE.move_to_end(key)
+        return True
+
+    def save_cache(
+        self,
+        key:tuple,
+    )->None:
+        """
+        Put the results into _RUN_CACHE, evicting the least recently used results beyond RUN_CACHE_MAX_SIZE.
+        """
+
+        _RUN_CACHE[key] = (timer.perf_counter(), self.exit_code, self._stdout, self._stderr, self.time_used)
+        _RUN_CACHE.move_to_end(key)
+
+        while (len(_RUN_CACHE) > RUN_CACHE_MAX_SIZE):
+            try:
+                _RUN_CACHE.popitem(last=False)
+            except KeyError as e:
+                break
+
+        return None
+
+    @staticmethod
+    def clear_cache()->None:
+        """
+        Discard all results cached by run().
+        """
+        _RUN_CACHE.clear()
 
     def set_result(
         self,
@@ -644,18 +1252,60 @@ class ShellCommand(ShellPipe):
         if (exit_code is None): exit_code = self.process.returncode
         self.exit_code = exit_code
 
-        if (self.output is str):
-            self.stdout = stdout.decode("utf-8")
-            self.stderr = stderr.decode("utf-8")
-        else:
-            self.stdout = stdout
-            self.stderr = stderr
-            
+        # Pipes not captured give None
+        if (stdout is None): stdout = b""
+        if (stderr is None): stderr = b""
+
+        # Decoded on first access, if ever
+        self.stdout, self.stderr = stdout, stderr
 
         self.time_used = time_used
 
         return self.result
 
+    @property
+    def stdout(
+        self,
+    )->Union[bytes, str]:
+        """
+        stdout of the process, as bytes or str depending on output.
+
+        Only decoded on first access; callers that only check exit_code never pay for it.
+        """
+        if (self.output is str and isinstance(self._stdout, bytes)):
+            # Empty outputs need no decoding
+            self._stdout = self._stdout.decode("utf-8") if self._stdout else ""
+
+        return self._stdout
+
+    @stdout.setter
+    def stdout(
+        self,
+        value:Union[bytes, str],
+    ):
+        self._stdout = value
+
+    @property
+    def stderr(
+        self,
+    )->Union[bytes, str]:
+        """
+        stderr of the process, as bytes or str depending on output.
+
+        stderr is often never looked at, so it is only decoded on first access.
+        """
+        if (self.output is str and isinstance(self._stderr, bytes)):
+            self._stderr = self._stderr.decode("utf-8") if self._stderr else ""
+
+        return self._stderr
+
+    @stderr.setter
+    def stderr(
+        self,
+        value:Union[bytes, str],
+    ):
+        self._stderr = value
+
     @property
     def result(
         self,
@@ -677,7 +1327,7 @@ class ShellCommand(ShellPipe):
                 exit_code = self.exit_code,
                 command = self.command,
                 stdout = self.stdout,
-                time_used = self.lapsed,
+                time_used = self.time_used,
             )
 
     #########
@@ -761,7 +1411,6 @@ class ShellCommand(ShellPipe):
 
         return _lapsed
 
-    @alive_only
     def kill(
         self,
         exit_code=None,
@@ -770,6 +1419,9 @@ class ShellCommand(ShellPipe):
         Kill the process, and get the result.
         """
 
+        if (self.process is None or self.process.returncode is not None):
+            return ShellProcessInactive(command=self.command)
+
         self.process.kill()
 
         _stdout, _stderr = self.process.communicate()
@@ -780,23 +1432,51 @@ class ShellCommand(ShellPipe):
             stderr = _stderr,
         )
 
-    @alive_only
     def iter_stdout(
         self,
         chunk_size:int=DEFAULT_STDOUT_CHUNK_SIZE,
+        coalesce:bool=False,
     )->Union[bytes, str]:
         """
         Iter over stdout
+
+        Reads directly from the file descriptor, bypassing the BufferedReader of process.stdout;
+        each chunk is whatever is available in the pipe, up to chunk_size.
+
+        Data is read into one reusable buffer rather than a new chunk_size allocation per read;
+        each chunk yielded is a copy of only the bytes actually read.
+        See iter_stdout_into() to avoid the copy as well.
+
+        If coalesce is True, reads are gathered until chunk_size bytes are available,
+        so every chunk is exactly chunk_size bytes except the last;
+        useful when the process writes in many small pieces.
         """
-        while (_data := self.process.stdout.read(chunk_size)):
-            if (len(_data)):
-                yield _data
-            else:
-                break
 
-            
+        # Not self.alive: this is cheaper than a poll(), and a process that has exited may still have output to collect
+        if (self.process is None or self.process.returncode is not None):
+            return ShellProcessInactive(command=self.command)
+
+        _read = read_full_into if coalesce else read_into
+
+        return (bytes(_chunk) for _chunk in _read(self.process.stdout.fileno(), bytearray(chunk_size)))
+
+    def iter_stdout_into(
+        self,
+        buffer:bytearray,
+    )->Iterator[memoryview]:
+        """
+        Iter over stdout, reading into buffer supplied by the caller
+
+        Each chunk yielded is a memoryview into buffer, of up to len(buffer) bytes;
+        nothing is allocated per chunk. The view is only valid until the next chunk is read,
+        so copy it with bytes() if it needs to be kept.
+        """
+
+        if (self.process is None or self.process.returncode is not None):
+            return ShellProcessInactive(command=self.command)
+
+        return read_into(self.process.stdout.fileno(), buffer)
 
-    @alive_only
     def stream_stdin(
         self,
         data:Union[bytes, str],
@@ -806,22 +1486,31 @@ class ShellCommand(ShellPipe):
         Usually used repeated in a loop to stream data.
         """
 
-        if (isinstance(data, str)):
-            data = data.encode("utf-8")
+        if (self.process is None or self.process.returncode is not None):
+            return ShellProcessInactive(command=self.command)
 
-        self.process.stdin.write(data)
+        # bytes is the expected case; only pay for the encoding when the pipe rejects a str
+        try:
+            self.process.stdin.write(data)
+        except TypeError as e:
+            if (isinstance(data, str)):
+                self.process.stdin.write(data.encode("utf-8"))
+            else:
+                raise
 
-    @alive_only
     def stream_stdout(
         self,
         fHnd:io.IOBase,
         chunk_size:int=DEFAULT_STDOUT_CHUNK_SIZE,
         callback:Callable=None
-    ):
+    )->concurrent.futures.Future:
         """
-        Start a new thread pushing stdout data through to a IO object.
+        Push stdout data through to a IO object in a background thread.
         Normally used when stdout from a program is also streamed from slow IO, like a network.
 
+        Threads are taken from a shared pool; return a Future which resolves into the total number of bytes pushed
+        once stdout is exhausted.
+
         Supports triggering a callback when everything is done, in the following format:
         def callback(
             command:ShellCommand,
@@ -832,13 +1521,28 @@ class ShellCommand(ShellPipe):
 
         Using both *args and **kwargs are highly recommended, as it futureproofs against
         any new arguments being added.
+
+        If reactor_streams is True, the stream is served by a single thread shared by all streams instead;
+        see shell.reactor.StreamReactor.
         """
 
+        if (self.process is None or self.process.returncode is not None):
+            return ShellProcessInactive(command=self.command)
+
+        _in_fd = self.process.stdout.fileno()
+
+        if (self.reactor_streams):
+            def _on_done(bytes_total:int):
+                if (callable(callback)):
+                    callback(
+                        command=self,
+                        bytes_total=bytes_total,
+                    )
+
+            return stream_reactor().submit(_in_fd, fHnd, chunk_size, on_done=_on_done)
+
         def _push_data():
-            _bytes_total = 0
-            for _chunk in self.iter_stdout(chunk_size=chunk_size):
-                _bytes_total += len(_chunk)
-                fHnd.write(_chunk)
+            _bytes_total = push_data(_in_fd, fHnd, chunk_size)
 
             if (callable(callback)):
                 callback(
@@ -846,4 +1550,227 @@ class ShellCommand(ShellPipe):
                     bytes_total=_bytes_total,
                 )
 
-        threading.Thread(target=_push_data).start()
+            return _bytes_total
+
+        return stream_pool().submit(_push_data)
+
+
+class ShellPipeline(ShellPipe):
+    """
+    Part of a ShellPipe, with multiple ShellCommands connected by pipes, like a | b | c in shell.
+
+    Created by | between ShellCommands that are yet to run.
+    Nothing is run until the result is needed; then all the commands run concurrently,
+    each stdout connected straight into the next stdin by the kernel, without passing through Python.
+
+    The results stdout, stderr, exit_code and time_used are taken from the last command,
+    after running the pipeline if necessary.
+    """
+
+    __slots__ = ("stages", "failure")
+
+    result_attributes = frozenset(("stdout", "stderr", "exit_code", "time_used"))   # Delegated to the last command
+
+    def __new__(
+        cls,
+        *stages:Union[ShellCommand, "ShellPipeline"],
+    )->"ShellPipeline":
+        # Override the ShellPipe method.
+        return object.__new__(cls)
+
+    def __init__(
+        self,
+        *stages:Union[ShellCommand, "ShellPipeline"],
+    )->None:
+        """
+        Pipelines among stages are flattened into their commands.
+        """
+        _stages = []
+
+        for _stage in stages:
+            if (isinstance(_stage, ShellPipeline)):
+                _stages.extend(_stage.stages)
+            elif (isinstance(_stage, ShellCommand)):
+                _stages.append(_stage)
+            else:
+                raise InvalidParameterError(f"ShellCommand expected in a ShellPipeline, {type(_stage).__name__} found.")
+
+        self.stages = tuple(_stages)
+        self.failure = None     # Failure of a command before the last, raised on every access to the result
+
+    def __repr__(
+        self,
+    )->str:
+        return " | ".join(map(repr, self.stages))
+
+    def __getattr__(
+        self,
+        name:str,
+    ):
+        # Anything else, e.g. hasattr() or copy's __deepcopy__ lookup, must not run the pipeline
+        if (name not in self.result_attributes):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        # Results of the last command are there to be inspected even if a command before it failed
+        if (not self.has_run):
+            self.start(pipe_stdin=False)
+            self.end()
+
+        return getattr(self.stages[-1], name)
+
+    @property
+    def has_run(
+        self,
+    )->bool:
+        """
+        Check if the pipeline has ever been run.
+        """
+        return self.stages[0].has_run
+
+    @property
+    def result(
+        self,
+    )->Union[bytes, str, ShellReturnedFailure]:
+        """
+        Run the pipeline if necessary, and return the result of the last command.
+        Raise the failure of any command before it, see end().
+        """
+        return self.run()
+
+    def start(
+        self,
+        pipe_stdin:bool=True,
+    )->None:
+        """
+        Start all the commands, each with stdin connected to stdout of the command before.
+        """
+
+        _stdin = pipe_stdin
+
+        for _stage in self.stages:
+            _stage.start(pipe_stdin=_stdin)
+
+            if (not isinstance(_stdin, bool)):
+                # _stage now holds the read end of the pipe; if we keep ours open,
+                # the command before would never get SIGPIPE should _stage exit early.
+                _stdin.close()
+
+            # A command that cannot be started gives the next one an empty stdin
+            _stdin = _stage.process.stdout if _stage.can_run else False
+
+    def end(
+        self,
+        stdin:bytes=None,
+    )->None:
+        """
+        Feed stdin into the first command, collect stdout of the last command and stderr of all of them,
+        and wait for all the commands to exit.
+
+        Keep the failure of any command but the last in self.failure, for run() to raise,
+        unless it was killed by SIGPIPE because the command after it exited early;
+        shell does not treat that as a failure either.
+        """
+
+        _head, _tail = self.stages[0], self.stages[-1]
+
+        _stdout, *_stderrs = drain_pipes(
+            _tail.process.stdout if _tail.can_run else None,
+            *(_stage.process.stderr if _stage.can_run else None for _stage in self.stages),
+            stdin_pipe=_head.process.stdin if _head.can_run else None,
+            stdin=stdin,
+        )
+
+        for _stage, _stderr in zip(self.stages, _stderrs):
+            # Commands that could not be started already have their results
+            if (_stage.can_run and _stage.exit_code is None):
+                _stage.process.wait()
+                _stage.set_result(
+                    exit_code = _stage.process.returncode,
+                    stdout = _stdout if _stage is _tail else b"",
+                    stderr = _stderr,
+                )
+
+        for _stage in self.stages[:-1]:
+            _result = _stage.result
+            if (isinstance(_result, Exception) and
+                _stage.exit_code != -signal.SIGPIPE):
+                self.failure = _result
+                break
+
+    def run(
+        self,
+        stdin:bytes=None,
+    )->Union[bytes, str, ShellReturnedFailure]:
+        """
+        Run the pipeline once in blocking mode, then return the result of the last command.
+        If a command before the last failed, that failure is raised instead, on this and every later call.
+        """
+
+        stdin = coerce_bytes(stdin)
+
+        if (not self.has_run):
+            self.start(pipe_stdin=stdin is not None)
+            self.end(stdin)
+
+        if (self.failure is not None):
+            # A fresh traceback each time, rather than one growing with every raise
+            raise self.failure.with_traceback(None)
+
+        return self.stages[-1].result
+
+    def pipe_out(
+        self,
+        *args,
+        **kwargs,
+    )->Union[
+        bytes,
+        ShellReturnedFailure,
+    ]:
+        """
+        Return the result of the last command as bytes.
+        """
+        self.run()
+
+        return self.stages[-1].pipe_out()
+
+    def pipe_in(
+        self,
+        stdin:Union[
+              bytes,
+              ShellPipe,
+        ],
+        *args,
+        **kwargs,
+    )->"ShellPipeline":
+        """
+        Pipe bytes as stdin into the first command, and run the pipeline.
+
+        Return itself to be chained
+        """
+        if (isinstance(stdin, ShellPipe)):
+            stdin = stdin.pipe_out()
+
+        self.run(
+            stdin,
+        )
+
+        return self
+
+
+# Type mapping table for ShellPipe.__new__(); defined here as it needs all the subclasses.
+_TYPE_MAP = {
+    list:       ShellCommand,
+    tuple:      ShellCommand,
+    bytes:      ShellBytesPipe,
+    str:        ShellStrPipe,
+}
+
+# Concrete ShellPipe classes, for exact class lookups in ShellPipe.__or__()
+_PIPE_CLASSES = frozenset((
+    ShellBytesPipe,
+    ShellStrPipe,
+    ShellIOPipe,
+    ShellFunctionPipe,
+    ShellCommand,
+    ShellPipeline,
+))
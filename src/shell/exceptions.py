@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
+import shlex
 
 class ShellError(Exception):
     def __bool__(self):
         return False
-    __nonzero__ = __bool__
 
 class InvalidParameterError(ValueError, ShellError):
     pass
@@ -12,6 +12,8 @@ class ShellPipeImpossible(OSError, ShellError):
     pass
 
 class ShellReturnedFailure(RuntimeError, ShellError):
+    message_format = "Shell command returned Code {:d}: {:s}"
+
     def __init__(
         self,
         stderr:str,
@@ -28,8 +30,51 @@ class ShellReturnedFailure(RuntimeError, ShellError):
         self.stderr = stderr
         self.time_used = time_used
 
-class ShellProcessInactive(OSError, ShellError):
-    pass
+    def __str__(self):
+        # stderr is only decoded and stripped when the message is actually requested
+        if (isinstance(self.stderr, (bytes, bytearray))):
+            _stderr = self.stderr.decode("utf-8", "replace")
+        else:
+            _stderr = str(self.stderr)
+
+        return self.message_format.format(
+            self.exit_code,
+            _stderr.strip(),
+        )
+
+class ShellProcessStateError(OSError, ShellError):
+    """
+    Base class for errors about the state of a subprocess.
+
+    If command is given, the message is only formatted from message_format when it is requested.
+    """
+    message_format = "{message}"
+
+    def __init__(
+        self,
+        message:str="",
+        command:list=None,
+        pid:int=None,
+    ):
+        super().__init__(message)
+
+        self.command = command
+        self.pid = pid
+
+    def __str__(self):
+        if (self.command is None):
+            return super().__str__()
+
+        return self.message_format.format(
+            command=shlex.join(self.command),   # Quoted, so that it can be pasted back into a shell
+            pid=self.pid,
+        )
+
+    def __repr__(self):
+        return f"{type(self).__name__}({repr(str(self))})"
+
+class ShellProcessInactive(ShellProcessStateError):
+    message_format = "Subprocess for {command} is inactive."
 
-class ShellProcessAlreadyRunning(OSError, ShellError):
-    pass
\ No newline at end of file
+class ShellProcessAlreadyRunning(ShellProcessStateError):
+    message_format = "Subprocess for {command} is already running at PID {pid}."
\ No newline at end of file
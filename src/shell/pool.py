@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+# Pre-started copies of one command, for filter-style commands run over and over with different stdin.
+# Starting a process, and the loading and linking of the program, is then done ahead of time
+# rather than while the caller waits.
+
+import collections
+import threading
+
+from typing import Union
+
+from shell.classes import ShellCommand, stream_pool
+from shell.exceptions import ShellReturnedFailure
+
+class ShellCommandPool():
+    """
+    A pool of idle processes of the same command, each started and waiting for its stdin.
+
+    Each run() takes an idle process, feeds it stdin and returns its result;
+    a replacement process is started in the background, keeping size processes ready.
+    A process only serves one run(), as it exits once its stdin is closed.
+    At most one replacement task is in flight at a time, so concurrent run()s cannot overfill the pool.
+
+    Keyword arguments other than size are passed on to ShellCommand.
+    """
+
+    def __init__(
+        self,
+        command:Union[str, list, tuple],
+        size:int=4,
+        **kwargs,
+    )->None:
+        self.command = command
+        self.size = size
+        self.kwargs = kwargs
+        self.closed = False
+        self.replenishing = False   # Whether a replenish() is submitted or running
+
+        # Guards idle, closed and replenishing together; replenish() runs in another thread
+        self.lock = threading.Lock()
+        self.idle = collections.deque(
+            self.spawn() for _ in range(size)
+        )
+
+    def __repr__(
+        self,
+    )->str:
+        return f"{type(self).__name__}(command={repr(self.command)}, size={repr(self.size)})"
+
+    def __enter__(
+        self,
+    ):
+        return self
+
+    def __exit__(
+        self,
+        exception_type,
+        exception_value,
+        exception_traceback,
+    ):
+        self.close()
+
+    def spawn(
+        self,
+    )->ShellCommand:
+        """
+        Create and start a new ShellCommand.
+        """
+
+        _command = ShellCommand(self.command, **self.kwargs)
+        _command.start()
+
+        return _command
+
+    def replenish(
+        self,
+    )->None:
+        """
+        Start new processes until there are size idle ones, or the pool is closed.
+        Only to be submitted by run(), which ensures that there is only one at a time.
+        """
+
+        try:
+            while True:
+                with self.lock:
+                    if (self.closed or len(self.idle) >= self.size):
+                        self.replenishing = False
+                        return
+
+                # Spawned outside of the lock, so that run() is not held up
+                _command = self.spawn()
+
+                with self.lock:
+                    _closed = self.closed
+                    if (not _closed):
+                        self.idle.append(_command)
+
+                if (_closed):
+                    # close() has already killed the idle processes; this one would wait on stdin forever
+                    _command.kill()
+        except Exception as e:
+            with self.lock:
+                self.replenishing = False
+            raise
+
+    def run(
+        self,
+        stdin:Union[bytes, str]=None,
+    )->Union[bytes, str, ShellReturnedFailure]:
+        """
+        Run the command with stdin on an idle process, then return the result as ShellCommand.result.
+        """
+
+        with self.lock:
+            _command = self.idle.popleft() if self.idle else None
+
+            _replenish = not (self.closed or self.replenishing)
+            if (_replenish):
+                self.replenishing = True
+
+        if (_command is None):
+            _command = self.spawn()
+
+        if (_replenish):
+            stream_pool().submit(self.replenish)
+
+        # The process has been idle since start(); only count the time spent on this run
+        if (_command.can_run):
+            _command.start_timer()
+
+        return _command.run(stdin)
+
+    def close(
+        self,
+    )->None:
+        """
+        Kill all idle processes. No more processes will be started.
+        """
+
+        with self.lock:
+            self.closed = True
+            _idle = list(self.idle)
+            self.idle.clear()
+
+        for _command in _idle:
+            _command.kill()
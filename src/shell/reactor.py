@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+# One selector thread serving the stdout streams of many processes at once,
+# instead of a thread blocked on each; see ShellCommand.reactor_streams.
+
+import concurrent.futures
+import os
+import selectors
+import threading
+
+from typing import Any, BinaryIO, Callable, List
+
+from shell.stream import accepts_views, write_chunk
+
+class StreamReactor():
+    """
+    Push stdout of many processes into their file objects from a single background thread.
+
+    Pipes are polled with a selector, and whichever is ready is read and written into its file object;
+    so all the writing happens in the one thread, and a slow file object holds up every stream.
+    Best suited to many concurrent streams into fast destinations, such as files or in-memory buffers.
+    """
+
+    def __init__(
+        self,
+    )->None:
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.closing = False
+
+        # Registering a stream must interrupt a select() already in progress
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ)
+
+        self.thread = threading.Thread(target=self.loop, name="shell-stream-reactor", daemon=True)
+        self.thread.start()
+
+    def __repr__(
+        self,
+    )->str:
+        return f"{type(self).__name__}(streams={len(self.selector.get_map()) - 1})"
+
+    def wake(
+        self,
+    )->None:
+        """
+        Interrupt the selector, so that changes are picked up.
+        """
+        try:
+            os.write(self.wake_w, b"\0")
+        except BlockingIOError as e:
+            # Already plenty of wake ups pending
+            pass
+
+    def submit(
+        self,
+        in_fd:int,
+        fHnd:BinaryIO,
+        chunk_size:int,
+        on_done:Callable=None,
+    )->concurrent.futures.Future:
+        """
+        Push all data from in_fd into fHnd.
+        Return a Future which resolves into the number of bytes pushed once in_fd is exhausted;
+        on_done(bytes_total) is called just before.
+        """
+
+        if (self.closing):
+            raise RuntimeError(f"{type(self).__name__} has been shut down.")
+
+        _future = concurrent.futures.Future()
+        _future.set_running_or_notify_cancel()
+
+        os.set_blocking(in_fd, False)
+
+        # [fHnd, buffer, bytes_total, future, on_done, whether fHnd can be given views into buffer]
+        with self.lock:
+            self.selector.register(in_fd, selectors.EVENT_READ, [fHnd, bytearray(chunk_size), 0, _future, on_done, accepts_views(fHnd)])
+
+        self.wake()
+        return _future
+
+    def loop(
+        self,
+    )->None:
+        """
+        Serve streams until shut down and no streams are left.
+        """
+
+        while (not (self.closing and len(self.selector.get_map()) <= 1)):
+            for _key, _events in self.selector.select():
+                if (_key.fd == self.wake_r):
+                    while True:
+                        try:
+                            if (not os.read(self.wake_r, 4096)):
+                                break
+                        except BlockingIOError as e:
+                            break
+                    continue
+
+                self.pump(_key.fd, _key.data)
+
+        self.selector.close()
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+
+    def pump(
+        self,
+        in_fd:int,
+        stream:List[Any],
+    )->None:
+        """
+        Move whatever is available in in_fd into its file object, and finish the stream at the end of data.
+
+        The stream fails if the file object cannot take all of the data, e.g. a non-blocking file that is full;
+        nothing read is ever dropped silently.
+        """
+
+        _fHnd, _buffer, _bytes_total, _future, _on_done, _views = stream
+
+        try:
+            try:
+                _size = os.readv(in_fd, (_buffer, ))
+            except BlockingIOError as e:
+                # Nothing to read after all; wait for the next event
+                return
+
+            if (_size):
+                write_chunk(_fHnd, memoryview(_buffer)[:_size], _views)
+                stream[2] += _size
+                return
+
+            with self.lock:
+                self.selector.unregister(in_fd)
+
+            if (callable(_on_done)):
+                _on_done(_bytes_total)
+
+            _future.set_result(_bytes_total)
+        except Exception as e:
+            with self.lock:
+                if (in_fd in self.selector.get_map()):
+                    self.selector.unregister(in_fd)
+
+            _future.set_exception(e)
+
+    def shutdown(
+        self,
+        wait:bool=True,
+    )->None:
+        """
+        Stop accepting new streams; the thread exits once the current streams are finished.
+        If wait is True, block until then.
+
+        Can be called more than once.
+        """
+
+        # The thread closes the wake up pipe on its way out; only wake it once
+        if (not self.closing):
+            self.closing = True
+            self.wake()
+
+        if (wait):
+            self.thread.join()
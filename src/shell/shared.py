@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+# A long-lived /bin/sh that runs commands on behalf of ShellCommand.
+# Starting a process from a large Python parent is comparatively expensive;
+# a small shell that is already running can fork and exec the command for a fraction of the cost.
+
+import os
+import re
+import secrets
+import selectors
+import shlex
+import subprocess
+import threading
+
+from typing import List, Tuple, Union
+
+# Redirections for (capture, stderr_mode); see ShellCommand.
+_REDIRECTS = {
+    (True, "capture"):  "",
+    (True, "devnull"):  " 2>/dev/null",
+    (True, "merge"):    " 2>&1",
+    (False, "capture"): " >/dev/null 2>/dev/null",
+    (False, "devnull"): " >/dev/null 2>/dev/null",
+    (False, "merge"):   " >/dev/null 2>/dev/null",
+}
+
+SHARED_SHELL_READ_SIZE = 2**16
+
+_SHELL_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")   # Environment variables the shell can export
+
+class SharedShell():
+    """
+    A persistent shell process, to which commands are dispatched instead of each being started by Python.
+
+    Each command is written to stdin of the shell, followed by a printf of a random marker unique to this shell
+    into both stdout and stderr, the former carrying the exit code. Output is read until the markers are found.
+
+    Commands are run in a subshell with exec, so that they cannot change the state of the shared shell,
+    and with stdin from /dev/null, so that they cannot consume the commands that follow.
+    As with Popen, they run in the current working directory and environment of this process:
+    the subshell changes into os.getcwd() first, and changes to os.environ are exported into the shell beforehand.
+
+    Exit codes are those reported by the shell. These match Popen, except for a command killed by signal N:
+    the shell reports 128+N where Popen gives -N, and cannot tell this apart from a command exiting with 128+N.
+
+    To have ShellCommand.run() use it:
+        ShellCommand.shared_shell = SharedShell()
+    """
+
+    def __init__(
+        self,
+        shell:str="/bin/sh",
+    )->None:
+        self.shell = shell
+        self.process = None
+        self.environ = {}   # Environment of the shell process, as last synchronised
+        self.lock = threading.Lock()
+
+    def __repr__(
+        self,
+    )->str:
+        return f"{type(self).__name__}(shell={repr(self.shell)})"
+
+    def __enter__(
+        self,
+    ):
+        return self
+
+    def __exit__(
+        self,
+        exception_type,
+        exception_value,
+        exception_traceback,
+    ):
+        self.close()
+
+    @property
+    def alive(
+        self,
+    )->bool:
+        """
+        Check if the shell process is started and alive.
+        """
+        return self.process is not None and self.process.poll() is None
+
+    def start(
+        self,
+    )->subprocess.Popen:
+        """
+        Start the shell process, with a new marker.
+        """
+
+        self.process = subprocess.Popen(
+            [self.shell],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+        )
+        self.environ = dict(os.environ)
+
+        self.marker = secrets.token_hex(16)
+        self.stdout_end = re.compile(self.marker.encode("ascii") + rb":(\d+):" + self.marker.encode("ascii") + rb"\Z")
+        self.stderr_end = self.marker.encode("ascii")
+
+        return self.process
+
+    def close(
+        self,
+    )->None:
+        """
+        Close stdin of the shell, and wait for it to exit.
+        """
+
+        if (self.process is not None):
+            _process, self.process = self.process, None
+
+            try:
+                _process.stdin.close()
+            except BrokenPipeError as e:
+                pass
+
+            _process.wait()
+            _process.stdout.close()
+            _process.stderr.close()
+
+    def run(
+        self,
+        command:List[str],
+        capture:bool=True,
+        stderr_mode:str="capture",
+    )->Union[Tuple[int, bytes, bytes], None]:
+        """
+        Run command in the shell, and return (exit_code, stdout, stderr).
+
+        Return None if the shell died before the command finished, e.g. it was killed;
+        the shell will be restarted on the next call.
+        Return None without running anything if os.environ cannot be passed through the shell,
+        i.e. a variable to be changed is not named as a shell variable.
+        """
+
+        with self.lock:
+            if (not self.alive):
+                self.close()
+                self.start()
+
+            _exports = self.sync_environ()
+
+            if (_exports is None):
+                return None
+
+            _line = f"{_exports}(cd -- {shlex.quote(os.getcwd())} && exec {shlex.join(command)}) </dev/null{_REDIRECTS[(capture, stderr_mode)]}; " \
+                    f"printf '{self.marker}:%d:{self.marker}' $?; printf '{self.marker}' >&2\n"
+
+            try:
+                self.process.stdin.write(_line.encode("utf-8"))
+            except BrokenPipeError as e:
+                self.close()
+                return None
+
+            _returned = self.collect()
+
+            if (_returned is None):
+                self.close()
+
+            return _returned
+
+    def sync_environ(
+        self,
+    )->Union[str, None]:
+        """
+        Return shell commands to bring the environment of the shell in line with os.environ,
+        and record the shell as up to date; an empty str if nothing has changed.
+        Return None if a variable that changed cannot be named in the shell.
+        """
+
+        _environ = dict(os.environ)
+
+        if (_environ == self.environ):
+            return ""
+
+        _commands = []
+
+        for _name, _value in _environ.items():
+            if (self.environ.get(_name) != _value):
+                if (not _SHELL_NAME.fullmatch(_name)):
+                    return None
+
+                _commands.append(f"export {_name}={shlex.quote(_value)}; ")
+
+        for _name in self.environ.keys() - _environ.keys():
+            if (not _SHELL_NAME.fullmatch(_name)):
+                return None
+
+            _commands.append(f"unset {_name}; ")
+
+        self.environ = _environ
+        return "".join(_commands)
+
+    def collect(
+        self,
+    )->Union[Tuple[int, bytes, bytes], None]:
+        """
+        Read stdout and stderr of the shell until both markers are found.
+        Return None if either pipe is closed first.
+        """
+
+        _stdout = bytearray()
+        _stderr = bytearray()
+        _match = None
+
+        with selectors.DefaultSelector() as _selector:
+            _selector.register(self.process.stdout, selectors.EVENT_READ, _stdout)
+            _selector.register(self.process.stderr, selectors.EVENT_READ, _stderr)
+
+            while (_selector.get_map()):
+                for _key, _events in _selector.select():
+                    _data = os.read(_key.fd, SHARED_SHELL_READ_SIZE)
+
+                    if (not _data):
+                        return None
+
+                    _buffer = _key.data
+                    _buffer += _data
+
+                    # The marker can only ever be at the very end, so only the tail needs searching
+                    if (_buffer is _stdout):
+                        _match = self.stdout_end.search(_stdout, max(0, len(_stdout) - 2 * len(self.marker) - 32))
+                        if (_match is not None):
+                            _selector.unregister(_key.fileobj)
+                    elif (_stderr.endswith(self.stderr_end)):
+                        _selector.unregister(_key.fileobj)
+
+        return (
+            int(_match.group(1)),
+            bytes(_stdout[:_match.start()]),
+            bytes(_stderr[:-len(self.stderr_end)]),
+        )
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+# Loops forwarding stdout of a process into a file object, used by ShellCommand.stream_stdout().
+# The per-chunk loops are kept apart from the rest of the package, statically typed and free of dynamic features,
+# so that this module is suitable for compiling with mypyc (`mypyc src/shell/stream.py`);
+# the pure Python module is used otherwise.
+
+import errno
+import io
+import os
+import queue
+import stat
+import threading
+
+from typing import Any, BinaryIO, Iterator, Union
+
+
+def splice_target_fd(
+    fHnd:Any,
+)->Union[int, None]:
+    """
+    Return the file descriptor of fHnd if it is backed by something splice() can write into:
+    a regular file, a pipe or FIFO, or a socket. Otherwise return None.
+    """
+
+    try:
+        _fd = fHnd.fileno()
+        _mode = os.fstat(_fd).st_mode
+        if (stat.S_ISREG(_mode) or stat.S_ISFIFO(_mode) or stat.S_ISSOCK(_mode)):
+            return _fd
+    except (AttributeError, OSError, ValueError) as e:
+        pass
+
+    return None
+
+def accepts_views(
+    fHnd:Any,
+)->bool:
+    """
+    Return whether fHnd is a binary file object from io, whose write() is done with the data by the time it returns.
+
+    Only these are given memoryviews into a buffer that is reused for the next read;
+    other file-like objects, e.g. a list collector or a queue, may keep what they are given, so they are given bytes.
+    """
+
+    return isinstance(fHnd, (io.RawIOBase, io.BufferedIOBase))
+
+def write_chunk(
+    fHnd:BinaryIO,
+    chunk:memoryview,
+    views:bool,
+)->None:
+    """
+    Write all of chunk into fHnd; views is the result of accepts_views(fHnd).
+
+    Raw files may write only part of it, or nothing at all if non-blocking, instead of raising;
+    the rest is written again, and BlockingIOError is raised if fHnd would block,
+    rather than the data being dropped.
+    """
+
+    if (not isinstance(fHnd, io.RawIOBase)):
+        fHnd.write(chunk if views else bytes(chunk))
+        return None
+
+    while (chunk):
+        _written = fHnd.write(chunk)
+
+        if (not _written):
+            raise BlockingIOError(errno.EAGAIN, f"{type(fHnd).__name__} cannot take more data without blocking.")
+
+        chunk = chunk[_written:]
+
+def splice_data(
+    in_fd:int,
+    out_fd:int,
+    chunk_size:int,
+)->int:
+    """
+    Move data from in_fd into out_fd with splice(), inside the kernel, until in_fd is exhausted.
+    Return the number of bytes moved.
+
+    If splice() is not possible - e.g. EINVAL for files opened in append mode - stop and return the bytes moved so far;
+    the rest of the data can still be read from in_fd.
+    """
+
+    _bytes_total = 0
+
+    try:
+        while (_sent := os.splice(in_fd, out_fd, chunk_size)):
+            _bytes_total += _sent
+    except OSError as e:
+        pass
+
+    return _bytes_total
+
+def read_into(
+    in_fd:int,
+    buffer:bytearray,
+)->Iterator[memoryview]:
+    """
+    Read from in_fd into buffer until in_fd is exhausted, yielding a memoryview of the bytes read each time.
+
+    Nothing is allocated per read; each view is only valid until the next one is yielded,
+    as the same buffer is overwritten.
+    """
+
+    _view = memoryview(buffer)
+
+    while (_size := os.readv(in_fd, (buffer, ))):
+        yield _view[:_size]
+
+def read_full_into(
+    in_fd:int,
+    buffer:bytearray,
+)->Iterator[memoryview]:
+    """
+    As read_into(), but keep reading until buffer is full before yielding it;
+    every view is len(buffer) bytes long except the last, so many small writes reach the consumer as few large chunks.
+    """
+
+    _view = memoryview(buffer)
+    _size = len(buffer)
+    _filled = 0
+
+    while (_read := os.readv(in_fd, (_view[_filled:], ))):
+        _filled += _read
+
+        if (_filled == _size):
+            yield _view
+            _filled = 0
+
+    if (_filled):
+        yield _view[:_filled]
+
+def is_fast_destination(
+    fHnd:Any,
+)->bool:
+    """
+    Return whether fHnd is known to be quick to write into: an in-memory buffer, or a regular file.
+    Anything else, e.g. an object sending data over a network, is assumed to be slow.
+    """
+
+    if (isinstance(fHnd, io.BytesIO)):
+        return True
+
+    try:
+        return stat.S_ISREG(os.fstat(fHnd.fileno()).st_mode)
+    except (AttributeError, OSError, ValueError) as e:
+        return False
+
+def copy_data(
+    in_fd:int,
+    fHnd:BinaryIO,
+    chunk_size:int,
+    overlap:bool=False,
+)->int:
+    """
+    Copy data read from in_fd into fHnd.write() until in_fd is exhausted.
+    Return the number of bytes copied.
+
+    If overlap is True, reading and writing overlap: a helper thread reads into one of two buffers
+    while fHnd.write() is still busy with the other, so a slow destination does not leave the pipe idle.
+    This costs a thread per call, so is only worth it for slow destinations.
+    """
+
+    _views = accepts_views(fHnd)
+
+    if (not overlap):
+        _bytes_total = 0
+
+        for _chunk in read_into(in_fd, bytearray(chunk_size)):
+            _bytes_total += len(_chunk)
+            write_chunk(fHnd, _chunk, _views)
+
+        return _bytes_total
+
+    _free: "queue.Queue[Union[bytearray, None]]" = queue.Queue()
+    _full: "queue.Queue[Any]" = queue.Queue()
+
+    for _ in range(2):
+        _free.put(bytearray(chunk_size))
+
+    def _reader()->None:
+        try:
+            while ((_buffer := _free.get()) is not None):
+                _size = os.readv(in_fd, (_buffer, ))
+                _full.put((_buffer, _size))
+
+                if (not _size):
+                    return
+        except OSError as e:
+            _full.put(e)
+
+    _thread = threading.Thread(target=_reader, name="shell-stream-reader", daemon=True)
+    _thread.start()
+
+    _bytes_total = 0
+
+    try:
+        while True:
+            _item = _full.get()
+
+            if (isinstance(_item, OSError)):
+                raise _item
+
+            _buffer, _size = _item
+            if (not _size):
+                break
+
+            write_chunk(fHnd, memoryview(_buffer)[:_size], _views)
+            _bytes_total += _size
+
+            # Only handed back once written, so the reader can never overwrite data in flight
+            _free.put(_buffer)
+    finally:
+        # Stop the reader if the writing failed; harmless if it has already finished.
+        # Not joined, as the reader may be blocked on a process that is not writing anything.
+        _free.put(None)
+
+    return _bytes_total
+
+def push_data(
+    in_fd:int,
+    fHnd:BinaryIO,
+    chunk_size:int,
+)->int:
+    """
+    Push all data from in_fd into fHnd, and return the number of bytes pushed.
+
+    Files, pipes and sockets can be written to by the kernel directly from the pipe, without copying through Python.
+    os.sendfile() cannot read from a pipe on Linux, so this uses splice() instead where available;
+    if splice() is refused part way, the rest is copied, overlapping reads with writes unless fHnd is fast.
+    """
+
+    _bytes_total = 0
+
+    _out_fd = splice_target_fd(fHnd)
+    if (_out_fd is not None and hasattr(os, "splice")):
+        fHnd.flush()
+        _bytes_total += splice_data(in_fd, _out_fd, chunk_size)
+
+    return _bytes_total + copy_data(in_fd, fHnd, chunk_size, overlap=not is_fast_destination(fHnd))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import unittest
+
+from shell import ShellCommand, ShellPipeline
+from shell.exceptions import ShellReturnedFailure
+
+class TestShellPipeline(unittest.TestCase):
+    def test_stdout_passes_through(self):
+        _pipeline = ShellCommand(["printf", "b\\na\\n"]) | ShellCommand("sort")
+
+        self.assertIsInstance(_pipeline, ShellPipeline)
+        self.assertEqual(_pipeline.result, b"a\nb\n")
+
+    def test_upstream_failure_raised_on_every_access(self):
+        _pipeline = ShellCommand(["sh", "-c", "exit 2"]) | ShellCommand("cat")
+
+        for _ in range(3):
+            with self.assertRaises(ShellReturnedFailure) as _context:
+                _pipeline.result
+
+            self.assertEqual(_context.exception.exit_code, 2)
+
+        with self.assertRaises(ShellReturnedFailure):
+            _pipeline.pipe_out()
+
+    def test_results_readable_after_upstream_failure(self):
+        _pipeline = ShellCommand(["sh", "-c", "exit 2"]) | ShellCommand("cat")
+
+        self.assertEqual(_pipeline.exit_code, 0)
+        self.assertEqual(_pipeline.stages[0].exit_code, 2)
+
+        with self.assertRaises(ShellReturnedFailure):
+            _pipeline.result
+
+    def test_sigpipe_is_not_a_failure(self):
+        _pipeline = ShellCommand("yes") | ShellCommand(["head", "-n", "2"])
+
+        self.assertEqual(_pipeline.result, b"y\ny\n")
+        self.assertEqual(_pipeline.result, b"y\ny\n")
+
+    def test_attribute_probes_do_not_run(self):
+        _pipeline = ShellCommand(["echo", "hi"]) | ShellCommand("cat")
+
+        self.assertFalse(hasattr(_pipeline, "alive"))
+        self.assertFalse(hasattr(_pipeline, "__deepcopy__"))
+        self.assertFalse(_pipeline.has_run)
+
+        self.assertEqual(_pipeline.stdout, b"hi\n")
+        self.assertTrue(_pipeline.has_run)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import concurrent.futures
+import time as timer
+import unittest
+
+from shell import ShellCommandPool
+
+def wait_until_replenished(
+    pool:ShellCommandPool,
+    timeout:float=5,
+)->None:
+    _deadline = timer.monotonic() + timeout
+
+    while (pool.replenishing and timer.monotonic() < _deadline):
+        timer.sleep(0.01)
+
+class TestShellCommandPool(unittest.TestCase):
+    def test_run_feeds_stdin(self):
+        with ShellCommandPool("cat", size=2) as _pool:
+            self.assertEqual(_pool.run(b"abc"), b"abc")
+            self.assertEqual(_pool.run("def"), b"def")
+
+    def test_concurrent_runs_keep_size(self):
+        with ShellCommandPool("cat", size=2) as _pool:
+            with concurrent.futures.ThreadPoolExecutor(8) as _executor:
+                _results = list(_executor.map(lambda i: _pool.run(b"%d" % i), range(20)))
+
+            self.assertEqual(_results, [b"%d" % i for i in range(20)])
+
+            wait_until_replenished(_pool)
+            self.assertEqual(len(_pool.idle), 2)
+
+    def test_close_kills_idle_processes(self):
+        _pool = ShellCommandPool("cat", size=2)
+        _pool.run(b"abc")
+
+        wait_until_replenished(_pool)
+        _idle = list(_pool.idle)
+        _pool.close()
+
+        self.assertEqual(len(_pool.idle), 0)
+        for _command in _idle:
+            self.assertIsNotNone(_command.process.returncode)
+
+    def test_no_processes_after_close(self):
+        _pool = ShellCommandPool("cat", size=2)
+        _pool.close()
+
+        self.assertEqual(_pool.run(b"abc"), b"abc")
+
+        wait_until_replenished(_pool)
+        self.assertEqual(len(_pool.idle), 0)
+
+if __name__ == "__main__":
+    unittest.main()
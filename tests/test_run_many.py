@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+import unittest
+
+from shell import ShellCommand, run_many_sync
+from shell.exceptions import ShellReturnedFailure
+
+class TestRunMany(unittest.TestCase):
+    def test_results_in_order(self):
+        self.assertEqual(
+            run_many_sync(["echo a", ["echo", "b"], "echo c"]),
+            [b"a\n", b"b\n", b"c\n"],
+        )
+
+    def test_timeout_keeps_partial_output(self):
+        _command = "sh -c 'echo partial; exec sleep 5'"
+
+        _result, = run_many_sync([_command], timeout=0.5)
+
+        self.assertIsInstance(_result, ShellReturnedFailure)
+        self.assertEqual(_result.stdout, b"partial\n")
+        self.assertEqual(_result.exit_code, -9)
+
+        # Same as running it on its own
+        _single = ShellCommand(_command, timeout=0.5)
+        _single.run()
+        self.assertEqual(_single.stdout, _result.stdout)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import os
+import signal
+import tempfile
+import unittest
+
+import shell
+from shell import SharedShell, ShellCommand
+
+class TestSharedShell(unittest.TestCase):
+    def setUp(self):
+        self.shared_shell = SharedShell()
+        self.cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        ShellCommand.shared_shell = None
+        self.shared_shell.close()
+
+    def test_output_and_exit_code(self):
+        _exit_code, _stdout, _stderr = self.shared_shell.run(["sh", "-c", "echo out; echo err >&2; exit 3"])
+
+        self.assertEqual(_exit_code, 3)
+        self.assertEqual(_stdout, b"out\n")
+        self.assertEqual(_stderr, b"err\n")
+
+    def test_output_without_newline(self):
+        self.assertEqual(self.shared_shell.run(["printf", "%s", "no newline"]), (0, b"no newline", b""))
+
+    def test_signal_exit_code(self):
+        _exit_code, _, _ = self.shared_shell.run(["sh", "-c", "kill -TERM $$"])
+
+        # As reported by the shell; Popen would give -SIGTERM
+        self.assertEqual(_exit_code, 128 + signal.SIGTERM)
+
+    def test_high_exit_code_kept(self):
+        ShellCommand.shared_shell = self.shared_shell
+
+        _command = ShellCommand(["sh", "-c", "exit 130"], ignore_codes=[130])
+
+        self.assertEqual(_command.run(), b"")
+        self.assertEqual(_command.exit_code, 130)
+
+    def test_follows_cwd(self):
+        # Started before the change of directory
+        self.shared_shell.run(["true"])
+
+        with tempfile.TemporaryDirectory() as _directory:
+            os.chdir(_directory)
+            _, _stdout, _ = self.shared_shell.run(["pwd", "-P"])
+
+            self.assertEqual(_stdout.decode("utf-8").strip(), os.path.realpath(_directory))
+
+    def test_follows_environ(self):
+        os.environ["SHELL_TEST_VARIABLE"] = "a b'c"
+        try:
+            _, _stdout, _ = self.shared_shell.run(["sh", "-c", "echo \"$SHELL_TEST_VARIABLE\""])
+            self.assertEqual(_stdout, b"a b'c\n")
+        finally:
+            del os.environ["SHELL_TEST_VARIABLE"]
+
+        _, _stdout, _ = self.shared_shell.run(["sh", "-c", "echo \"${SHELL_TEST_VARIABLE-unset}\""])
+        self.assertEqual(_stdout, b"unset\n")
+
+    def test_shell_command_dispatch(self):
+        ShellCommand.shared_shell = self.shared_shell
+
+        self.assertEqual(shell.run(["echo", "hi"]), b"hi\n")
+        self.assertFalse(shell.run(["sh", "-c", "exit 4"]))
+
+        _command = ShellCommand(["sh", "-c", "exit 4"])
+        _command.run()
+        self.assertEqual(_command.exit_code, 4)
+
+    def test_restarts_after_death(self):
+        self.shared_shell.run(["true"])
+        self.shared_shell.process.kill()
+        self.shared_shell.process.wait()
+
+        self.assertEqual(self.shared_shell.run(["echo", "back"]), (0, b"back\n", b""))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import io
+import os
+import subprocess
+import unittest
+
+from shell import ShellCommand
+
+class ChunkCollector():
+    """
+    A file-like object that keeps every chunk it is given, as a queue to a network sender would.
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+
+class TestStreamStdout(unittest.TestCase):
+    reactor_streams = False
+
+    def setUp(self):
+        ShellCommand.reactor_streams = self.reactor_streams
+
+    def tearDown(self):
+        ShellCommand.reactor_streams = False
+
+    def stream(self, command, fHnd, chunk_size):
+        _command = ShellCommand(command)
+        _command.start(pipe_stdin=False)
+        _bytes_total = _command.stream_stdout(fHnd, chunk_size=chunk_size).result(timeout=30)
+        _command.end()
+
+        return _bytes_total
+
+    def test_kept_chunks_are_not_overwritten(self):
+        _collector = ChunkCollector()
+        self.stream(["sh", "-c", "printf aaa; sleep 0.1; printf bbb; sleep 0.1; printf ccc"], _collector, 3)
+
+        self.assertEqual([bytes(_chunk) for _chunk in _collector.chunks], [b"aaa", b"bbb", b"ccc"])
+
+    def test_large_output_into_buffer(self):
+        _command = ["seq", "1", "200000"]
+        _expected = subprocess.run(_command, stdout=subprocess.PIPE, check=True).stdout
+
+        _buffer = io.BytesIO()
+        _bytes_total = self.stream(_command, _buffer, 4096)
+
+        self.assertEqual(_buffer.getvalue(), _expected)
+        self.assertEqual(_bytes_total, len(_expected))
+
+    def test_large_output_into_collector(self):
+        _command = ["seq", "1", "200000"]
+        _expected = subprocess.run(_command, stdout=subprocess.PIPE, check=True).stdout
+
+        _collector = ChunkCollector()
+        self.stream(_command, _collector, 4096)
+
+        self.assertEqual(b"".join(_collector.chunks), _expected)
+
+    def test_full_destination_fails(self):
+        for _buffering in (0, -1):
+            _read_fd, _write_fd = os.pipe()
+            os.set_blocking(_write_fd, False)
+
+            _command = ShellCommand(["head", "-c", "1000000", "/dev/zero"])
+            _command.start(pipe_stdin=False)
+
+            try:
+                _future = _command.stream_stdout(os.fdopen(_write_fd, "wb", buffering=_buffering, closefd=False))
+
+                with self.assertRaises(BlockingIOError):
+                    _future.result(timeout=30)
+            finally:
+                _command.kill()
+                os.close(_read_fd)
+                os.close(_write_fd)
+
+    def test_callback(self):
+        _totals = []
+
+        _command = ShellCommand(["printf", "abcdef"])
+        _command.start(pipe_stdin=False)
+        _command.stream_stdout(
+            io.BytesIO(),
+            callback=lambda command, bytes_total, *args, **kwargs: _totals.append(bytes_total),
+        ).result(timeout=30)
+        _command.end()
+
+        self.assertEqual(_totals, [6])
+
+class TestStreamStdoutReactor(TestStreamStdout):
+    reactor_streams = True
+
+if __name__ == "__main__":
+    unittest.main()